@@ -1,7 +1,7 @@
 # app.py
+import altair as alt
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
 
 st.set_page_config(page_title="NAVIGATOR v1.0 (Demo)", layout="wide")
@@ -9,56 +9,88 @@ st.set_page_config(page_title="NAVIGATOR v1.0 (Demo)", layout="wide")
 # -----------------------------
 # Scoring utilities (v1.0, rule-based)
 # -----------------------------
-def clamp01(x: float) -> float:
-    return float(np.clip(x, 0.0, 1.0))
-
-def score_systemic(age: float, bmi: float) -> float:
+# Domain weights: (age, BMI) and (EMT, P4) risk; (euploid, grade) competence
+_W_AGE, _W_BMI = 0.55, 0.45
+_W_EMT, _W_PROG = 0.60, 0.40
+_W_EUPLOID, _W_GRADE = 0.70, 0.30
+# Global NAVIGATOR Index (GNI) weighting for this minimal input set
+# (Embryo 45%, Endometrium 35%, Systemic 20%)
+_GNI_EGS, _GNI_EPS, _GNI_SBS = 0.45, 0.35, 0.20
+
+def _clip(x, lo, hi):
+    # Plain comparisons for scalars (no NumPy dispatch); arrays/Series go through np.clip
+    if isinstance(x, (int, float)):
+        return lo if x < lo else (hi if x > hi else float(x))
+    return np.clip(x, lo, hi)
+
+def _as_flag(x):
+    # bool -> 0.0/1.0; arrays/Series of bools -> float array
+    return float(x) if isinstance(x, (bool, int, float, np.bool_)) else np.asarray(x, dtype=float)
+
+def score_systemic(age, bmi):
     """
     NAVIGATOR v1.0 demo: Systemic Biology Score (SBS), 0(best)-100(worst)
-    Using only age + BMI (as requested).
+    Using only age + BMI (as requested). Accepts scalars or arrays.
     """
-    age_r = clamp01((age - 30.0) / 15.0)     # starts increasing >30, saturates ~45
-    bmi_r = clamp01((bmi - 22.0) / 18.0)     # starts increasing >22, saturates ~40
-    sbs = 100.0 * (0.55 * age_r + 0.45 * bmi_r)
-    return float(np.clip(sbs, 0, 100))
+    age_r = _clip((age - 30.0) / 15.0, 0.0, 1.0)     # starts increasing >30, saturates ~45
+    bmi_r = _clip((bmi - 22.0) / 18.0, 0.0, 1.0)     # starts increasing >22, saturates ~40
+    sbs = 100.0 * (_W_AGE * age_r + _W_BMI * bmi_r)
+    return _clip(sbs, 0.0, 100.0)
 
-def score_endometrial(emt_mm: float, prog_ng_ml: float) -> float:
+def score_endometrial(emt_mm, prog_ng_ml):
     """
-    Endometrial Phenotype Score (EPS), 0(best)-100(worst)
+    Endometrial Phenotype Score (EPS), 0(best)-100(worst). Accepts scalars or arrays.
     - EMT risk increases when <7mm
     - Progesterone risk increases when <9.5 ng/mL (demo threshold; centers vary)
     """
-    emt_r = clamp01((7.0 - emt_mm) / 3.0)      # risk if <7; ~0 at >=7; high at <=4
-    prog_r = clamp01((9.5 - prog_ng_ml) / 6.0) # risk if <9.5; high at very low values
-    eps = 100.0 * (0.60 * emt_r + 0.40 * prog_r)
-    return float(np.clip(eps, 0, 100))
+    emt_r = _clip((7.0 - emt_mm) / 3.0, 0.0, 1.0)      # risk if <7; ~0 at >=7; high at <=4
+    prog_r = _clip((9.5 - prog_ng_ml) / 6.0, 0.0, 1.0) # risk if <9.5; high at very low values
+    eps = 100.0 * (_W_EMT * emt_r + _W_PROG * prog_r)
+    return _clip(eps, 0.0, 100.0)
 
-def score_embryo(euploid: bool, good_grade: bool) -> float:
+def score_embryo(euploid, good_grade):
     """
-    Embryo Genetics/Competence Score (EGS), 0(best)-100(worst)
+    Embryo Genetics/Competence Score (EGS), 0(best)-100(worst). Accepts scalars or arrays.
     """
     # simple competence proxy
-    competence = 0.70 * (1.0 if euploid else 0.0) + 0.30 * (1.0 if good_grade else 0.0)
-    emb_r = 1.0 - clamp01(competence)
+    competence = _W_EUPLOID * _as_flag(euploid) + _W_GRADE * _as_flag(good_grade)
+    emb_r = 1.0 - _clip(competence, 0.0, 1.0)
     egs = 100.0 * emb_r
-    return float(np.clip(egs, 0, 100))
+    return _clip(egs, 0.0, 100.0)
+
+def global_index(sbs, eps, egs):
+    """
+    Global NAVIGATOR Index (GNI), 0(best)-100(worst). Accepts scalars or arrays.
+    """
+    gni = _GNI_EGS * egs + _GNI_EPS * eps + _GNI_SBS * sbs
+    return _clip(gni, 0.0, 100.0)
 
+@st.cache_data(max_entries=256)
 def navigator_index(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade):
     sbs = score_systemic(age, bmi)
     eps = score_endometrial(emt_mm, prog_ng_ml)
     egs = score_embryo(euploid, good_grade)
+    return sbs, eps, egs, global_index(sbs, eps, egs)
 
-    # Global NAVIGATOR Index (GNI) weighting for this minimal input set
-    # (Embryo 45%, Endometrium 35%, Systemic 20%)
-    gni = 0.45 * egs + 0.35 * eps + 0.20 * sbs
-    return sbs, eps, egs, float(np.clip(gni, 0, 100))
+def navigator_index_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized navigator_index over many records (e.g. audit-trail reruns).
+    Expects columns age, bmi, emt_mm, prog_ng_ml, euploid, good_grade;
+    returns a copy with SBS, EPS, EGS and GNI added.
+    """
+    out = df.copy()
+    out["SBS"] = score_systemic(df["age"], df["bmi"])
+    out["EPS"] = score_endometrial(df["emt_mm"], df["prog_ng_ml"])
+    out["EGS"] = score_embryo(df["euploid"], df["good_grade"])
+    out["GNI"] = global_index(out["SBS"], out["EPS"], out["EGS"])
+    return out
+
+# Risk buckets: [0, 30) Low, [30, 60) Moderate, [60, 100] High
+_BUCKET_THRESH = np.array([30.0, 60.0])
+_BUCKET_LABELS = ("Low", "Moderate", "High")
 
 def bucket(score: float) -> str:
-    if score < 30:
-        return "Low"
-    if score < 60:
-        return "Moderate"
-    return "High"
+    return _BUCKET_LABELS[int(np.searchsorted(_BUCKET_THRESH, score, side="right"))]
 
 def primary_limiting_domain(sbs, eps, egs):
     d = {"Embryo": egs, "Endometrium": eps, "Systemic": sbs}
@@ -67,11 +99,33 @@ def primary_limiting_domain(sbs, eps, egs):
 # -----------------------------
 # Decision-tree style guidance (non-drug, standard clinic actions)
 # -----------------------------
-def suggest_path(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade, sbs, eps, egs, gni):
+# Rule tables: (threshold, bullet templates), checked in order; first match wins.
+_EMT_RULES = [  # fires when EMT < threshold
+    (7.0, ("Endometrium thickness is low (EMT {emt_mm:.1f} mm). Optimize endometrial preparation (standard protocol adjustments) before transfer.",
+           "If thin endometrium persists, consider uterine cavity evaluation (e.g., sonohysterography/hysteroscopy) per clinic practice.")),
+]
+_PROG_RULES = [  # fires when P4 < threshold
+    (9.5, ("Progesterone appears low (P4 {prog_ng_ml:.1f} ng/mL). Consider confirming progesterone on the day of transfer (or mid-luteal depending on protocol) and adjusting luteal support per clinic standards.",)),
+]
+_BMI_RULES = [  # fires when BMI >= threshold
+    (30, ("BMI is elevated (BMI {bmi:.1f}). Consider a pre-transfer optimization window focusing on weight, sleep, and activity—especially if repeated failures.",)),
+    (27, ("BMI is moderately elevated (BMI {bmi:.1f}). Lifestyle optimization may improve systemic environment before transfer.",)),
+]
+_AGE_RULES = [  # fires when age >= threshold
+    (38, ("Age is {age:.0f}. Consider prioritizing embryo genetics/selection and minimizing delays to transfer once readiness is confirmed.",)),
+]
+
+def _match_rule(rules, x, below=False):
+    return next((tpls for th, tpls in rules if (x < th if below else x >= th)), ())
+
+@st.cache_data(max_entries=256)
+def suggest_path(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade):
     """
     Outputs an IVF path suggestion as short, clinic-friendly bullets.
     Keeps actions within standard practice and avoids experimental add-ons.
+    Keyed on the six raw inputs only; scores come from the (cached) navigator_index.
     """
+    sbs, eps, egs, gni = navigator_index(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade)
     suggestions = []
 
     # 1) Embryo-first gate
@@ -88,25 +142,17 @@ def suggest_path(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade, sbs, eps, eg
             ["Proceed to endometrial and systemic optimization checks before transfer."]))
 
     # 2) Endometrial readiness
-    endo_actions = []
-    if emt_mm < 7.0:
-        endo_actions.append(f"Endometrium thickness is low (EMT {emt_mm:.1f} mm). Optimize endometrial preparation (standard protocol adjustments) before transfer.")
-        endo_actions.append("If thin endometrium persists, consider uterine cavity evaluation (e.g., sonohysterography/hysteroscopy) per clinic practice.")
-    if prog_ng_ml < 9.5:
-        endo_actions.append(f"Progesterone appears low (P4 {prog_ng_ml:.1f} ng/mL). Consider confirming progesterone on the day of transfer (or mid-luteal depending on protocol) and adjusting luteal support per clinic standards.")
+    vals = {"age": age, "bmi": bmi, "emt_mm": emt_mm, "prog_ng_ml": prog_ng_ml}
+    endo_actions = [t.format(**vals) for t in
+                    _match_rule(_EMT_RULES, emt_mm, below=True) + _match_rule(_PROG_RULES, prog_ng_ml, below=True)]
     if not endo_actions:
         endo_actions.append("Endometrial readiness markers (EMT and progesterone) look acceptable for proceeding within standard workflows.")
 
     suggestions.append(("Endometrial phenotype actions", endo_actions))
 
     # 3) Systemic optimization (standard lifestyle / endocrine checks)
-    sys_actions = []
-    if bmi >= 30:
-        sys_actions.append(f"BMI is elevated (BMI {bmi:.1f}). Consider a pre-transfer optimization window focusing on weight, sleep, and activity—especially if repeated failures.")
-    elif bmi >= 27:
-        sys_actions.append(f"BMI is moderately elevated (BMI {bmi:.1f}). Lifestyle optimization may improve systemic environment before transfer.")
-    if age >= 38:
-        sys_actions.append(f"Age is {age:.0f}. Consider prioritizing embryo genetics/selection and minimizing delays to transfer once readiness is confirmed.")
+    sys_actions = [t.format(**vals) for t in
+                   _match_rule(_BMI_RULES, bmi) + _match_rule(_AGE_RULES, age)]
     if not sys_actions:
         sys_actions.append("Systemic risk signals (age/BMI) are not strongly elevated; proceed with standard preparation.")
 
@@ -123,6 +169,30 @@ def suggest_path(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade, sbs, eps, eg
 
     return suggestions
 
+# -----------------------------
+# Export record
+# -----------------------------
+@st.cache_data(max_entries=256)
+def export_record(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade):
+    """
+    Single-row audit record, built column-wise so pandas skips list-of-dict inference.
+    """
+    sbs, eps, egs, gni = navigator_index(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade)
+    return pd.DataFrame({
+        "age": [age],
+        "bmi": [bmi],
+        "emt_mm": [emt_mm],
+        "prog_ng_ml": [prog_ng_ml],
+        "euploid": [int(euploid)],
+        "good_grade": [int(good_grade)],
+        "SBS": [round(sbs, 2)],
+        "EPS": [round(eps, 2)],
+        "EGS": [round(egs, 2)],
+        "GNI": [round(gni, 2)],
+        "overall_bucket": [bucket(gni)],
+        "primary_limiting_domain": [primary_limiting_domain(sbs, eps, egs)],
+    })
+
 # -----------------------------
 # UI
 # -----------------------------
@@ -134,44 +204,57 @@ left, right = st.columns([1, 1])
 with left:
     st.subheader("Patient & Cycle Inputs")
 
-    age = st.number_input("Age (years)", min_value=18, max_value=55, value=34, step=1)
-    bmi = st.number_input("BMI", min_value=15.0, max_value=50.0, value=25.0, step=0.1)
-    emt_mm = st.number_input("Endometrial thickness (EMT, mm)", min_value=3.0, max_value=20.0, value=9.0, step=0.1)
-    prog_ng_ml = st.number_input("Progesterone (ng/mL) around transfer", min_value=0.0, max_value=40.0, value=10.5, step=0.1)
+    # Edits stay client-side until "Compute", so one submit = one rerun
+    with st.form("inputs"):
+        age = st.number_input("Age (years)", min_value=18, max_value=55, value=34, step=1)
+        bmi = st.number_input("BMI", min_value=15.0, max_value=50.0, value=25.0, step=0.1)
+        emt_mm = st.number_input("Endometrial thickness (EMT, mm)", min_value=3.0, max_value=20.0, value=9.0, step=0.1)
+        prog_ng_ml = st.number_input("Progesterone (ng/mL) around transfer", min_value=0.0, max_value=40.0, value=10.5, step=0.1)
 
-    euploid = st.selectbox("Euploid embryo available?", options=["Yes", "No"], index=0) == "Yes"
-    good_grade = st.selectbox("Good embryo grade?", options=["Yes", "No"], index=0) == "Yes"
+        euploid = st.selectbox("Euploid embryo available?", options=["Yes", "No"], index=0) == "Yes"
+        good_grade = st.selectbox("Good embryo grade?", options=["Yes", "No"], index=0) == "Yes"
+
+        submitted = st.form_submit_button("Compute")
 
     st.markdown("---")
     st.caption("Note: Progesterone thresholds vary by clinic protocol; this demo uses 9.5 ng/mL as an example.")
 
-# compute
-sbs, eps, egs, gni = navigator_index(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade)
+# compute (on submit or first load; other reruns reuse the last results)
+if submitted or "sbs" not in st.session_state:
+    st.session_state["last_inputs"] = (age, bmi, emt_mm, prog_ng_ml, euploid, good_grade)
+    (st.session_state["sbs"], st.session_state["eps"],
+     st.session_state["egs"], st.session_state["gni"]) = navigator_index(*st.session_state["last_inputs"])
+
+age, bmi, emt_mm, prog_ng_ml, euploid, good_grade = st.session_state["last_inputs"]
+sbs, eps, egs, gni = (st.session_state[k] for k in ("sbs", "eps", "egs", "gni"))
+idx = np.searchsorted(_BUCKET_THRESH, np.array([sbs, eps, egs, gni]), side="right")
+b_sbs, b_eps, b_egs, b_gni = (_BUCKET_LABELS[i] for i in idx)
 
 with right:
     st.subheader("NAVIGATOR Outputs")
 
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Systemic (SBS)", f"{sbs:.1f}", bucket(sbs))
-    c2.metric("Endometrium (EPS)", f"{eps:.1f}", bucket(eps))
-    c3.metric("Embryo (EGS)", f"{egs:.1f}", bucket(egs))
-    c4.metric("Global (GNI)", f"{gni:.1f}", bucket(gni))
-
-    # Radar-ish bar chart (simple, clear)
-    fig, ax = plt.subplots(figsize=(6.2, 3.6))
-    labels = ["Systemic", "Endometrium", "Embryo", "Global"]
-    values = [sbs, eps, egs, gni]
-    ax.bar(labels, values)
-    ax.set_ylim(0, 100)
-    ax.set_ylabel("Risk score (0 best → 100 worst)")
-    ax.set_title("NAVIGATOR v1.0 Scores")
-    st.pyplot(fig, clear_figure=True)
+    c1.metric("Systemic (SBS)", f"{sbs:.1f}", b_sbs)
+    c2.metric("Endometrium (EPS)", f"{eps:.1f}", b_eps)
+    c3.metric("Embryo (EGS)", f"{egs:.1f}", b_egs)
+    c4.metric("Global (GNI)", f"{gni:.1f}", b_gni)
+
+    # Radar-ish bar chart (simple, clear); rendered client-side by Vega-Lite
+    chart_df = pd.DataFrame({
+        "domain": ["Systemic", "Endometrium", "Embryo", "Global"],
+        "score": [sbs, eps, egs, gni],
+    })
+    chart = alt.Chart(chart_df, title="NAVIGATOR v1.0 Scores").mark_bar().encode(
+        x=alt.X("domain", sort=None, title=None),
+        y=alt.Y("score", scale=alt.Scale(domain=[0, 100]), title="Risk score (0 best → 100 worst)"),
+    )
+    st.altair_chart(chart, use_container_width=True)
 
 st.markdown("---")
 
 # Suggested path
 st.subheader("Suggested Patient IVF Path (Decision Tree Output)")
-suggestions = suggest_path(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade, sbs, eps, egs, gni)
+suggestions = suggest_path(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade)
 
 for title, bullets in suggestions:
     with st.expander(title, expanded=True):
@@ -181,19 +264,6 @@ for title, bullets in suggestions:
 # Optional: show the underlying record (for exports later)
 st.markdown("---")
 st.subheader("Export-ready Record (for future audit trails)")
-row = pd.DataFrame([{
-    "age": age,
-    "bmi": bmi,
-    "emt_mm": emt_mm,
-    "prog_ng_ml": prog_ng_ml,
-    "euploid": int(euploid),
-    "good_grade": int(good_grade),
-    "SBS": round(sbs, 2),
-    "EPS": round(eps, 2),
-    "EGS": round(egs, 2),
-    "GNI": round(gni, 2),
-    "overall_bucket": bucket(gni),
-    "primary_limiting_domain": primary_limiting_domain(sbs, eps, egs)
-}])
-
-st.dataframe(row, use_container_width=True)
+row = export_record(age, bmi, emt_mm, prog_ng_ml, euploid, good_grade)
+
+st.table(row)